@@ -4,20 +4,43 @@ Author: Matthew Fenn
 """
 
 import os
-from qgis.PyQt.QtCore import QSettings, QTranslator, QCoreApplication
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from qgis.PyQt.QtCore import Qt, QSettings, QTranslator
 from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import QAction, QMessageBox, QProgressDialog
 from qgis.core import (
     QgsProject,
     QgsVectorLayer,
     QgsVectorFileWriter,
-    QgsCoordinateReferenceSystem,
+    QgsReferencedRectangle,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsFields,
+    QgsGeometry,
+    QgsSpatialIndex,
+    QgsWkbTypes,
+    QgsPointXY,
     QgsMessageLog,
+    QgsApplication,
     Qgis
 )
 from qgis import processing
 
 from .cadastral_automation_dialog import CadastralAutomationDialog
+from .cadastral_task import CadastralTask, detach_layer
+
+# Number of worker threads used to clip Voronoi cells to blocks
+WORKER_THREADS = os.cpu_count() or 1
+
+# Cells handed to a worker thread at a time. Large blocks (notably the one
+# around the outside of the network) are split into several tasks so one
+# block can't leave the other workers idle
+CELLS_PER_TASK = 500
+
+# Grid (in target CRS units, i.e. meters) that block and Voronoi cell vertices
+# are snapped to, so the clip overlay between them doesn't produce slivers from
+# sub-millimeter coordinate noise
+SNAP_GRID_METERS = 0.001
 
 
 class CadastralAutomation:
@@ -41,6 +64,7 @@ class CadastralAutomation:
         self.toolbar.setObjectName('Cadastral Automation')
         
         self.dlg = None
+        self.task = None
 
     def add_action(
         self,
@@ -93,6 +117,9 @@ class CadastralAutomation:
 
     def unload(self):
         """Removes the plugin menu item and icon from QGIS GUI."""
+        if self.task is not None:
+            self.task.cancel()
+        
         for action in self.actions:
             self.iface.removePluginVectorMenu(
                 '&Cadastral Automation',
@@ -105,7 +132,10 @@ class CadastralAutomation:
         QgsMessageLog.logMessage(message, 'Cadastral Automation', level)
 
     def reproject_layer(self, layer, target_crs):
-        """Reproject layer to target CRS"""
+        """Reproject layer to target CRS (returns the input layer if already in target CRS)"""
+        if layer.crs() == target_crs:
+            return layer
+        
         return processing.run('native:reprojectlayer', {
             'INPUT': layer,
             'TARGET_CRS': target_crs,
@@ -124,46 +154,250 @@ class CadastralAutomation:
             'OUTPUT': 'memory:'
         })['OUTPUT']
 
-    def create_voronoi_polygons(self, building_layer):
-        """Create Voronoi (Thiessen) polygons from building points"""
-        return processing.run('qgis:voronoipolygons', {
-            'INPUT': building_layer,
-            'BUFFER': 30,  # 30% buffer around extent to ensure all points get polygons
-            'OUTPUT': 'memory:'
-        })['OUTPUT']
+    def dissolve_geometry(self, layer):
+        """Union all geometries of a layer into a single QgsGeometry"""
+        geometries = [f.geometry() for f in layer.getFeatures(QgsFeatureRequest().setNoAttributes())]
+        if len(geometries) == 1:
+            # Already dissolved (e.g. buffer_roads output)
+            return geometries[0]
+        return QgsGeometry.unaryUnion(geometries)
 
-    def intersect_with_blocks(self, cadastral_layer, blocks_layer):
-        """Intersect cadastral polygons with block boundaries to prevent cross-block polygons"""
-        return processing.run('native:intersection', {
-            'INPUT': cadastral_layer,
-            'OVERLAY': blocks_layer,
-            'INPUT_FIELDS': [],
-            'OVERLAY_FIELDS': [],
+    def extract_points_in_extent(self, point_layer, extent):
+        """Keep only points inside extent (given in the point layer's CRS)"""
+        return processing.run('native:extractbyextent', {
+            'INPUT': point_layer,
+            'EXTENT': QgsReferencedRectangle(extent, point_layer.crs()),
+            'CLIP': False,
             'OUTPUT': 'memory:'
         })['OUTPUT']
 
-    def subtract_roads(self, cadastral_layer, road_buffer_layer):
-        """Subtract road reserves from cadastral polygons"""
-        return processing.run('native:difference', {
-            'INPUT': cadastral_layer,
-            'OVERLAY': road_buffer_layer,
-            'OUTPUT': 'memory:'
-        })['OUTPUT']
+    def create_voronoi_polygons(self, building_layer, extent=None):
+        """
+        Create Voronoi (Thiessen) polygons from building points.
+        
+        Uses the GEOS Voronoi builder directly; each cell carries the
+        attributes of the building point it contains. If extent is given,
+        cells are cut to it and cells wholly outside it are dropped.
+        """
+        # Read the buildings once; the same features feed the diagram and the index
+        buildings = {f.id(): f for f in building_layer.getFeatures()}
+        points = QgsGeometry.fromMultiPointXY([
+            QgsPointXY(vertex)
+            for f in buildings.values()
+            for vertex in f.geometry().vertices()
+        ])
+        result = self.create_polygon_layer(
+            building_layer.crs(), building_layer.fields(), 'voronoi', 'Polygon')
+        if points.isEmpty():
+            return result
+        
+        # GEOS bounds the diagram by the points' envelope grown by its larger side
+        diagram = points.voronoiDiagram()
+        
+        # GEOS returns the cells unordered - find each cell's point to copy its attributes
+        index = QgsSpatialIndex(QgsSpatialIndex.FlagStoreFeatureGeometries)
+        index.addFeatures(list(buildings.values()))
+        extent_geom = QgsGeometry.fromRect(extent) if extent is not None else None
+        cells = []
+        for cell_geom in diagram.asGeometryCollection():
+            cell = QgsFeature(result.fields())
+            for building_id in index.intersects(cell_geom.boundingBox()):
+                if cell_geom.intersects(index.geometry(building_id)):
+                    cell.setAttributes(buildings[building_id].attributes())
+                    break
+            
+            # The outer cells reach far beyond the blocks - cut them down before
+            # they go through the area cull and the clip
+            if extent_geom is not None and not extent.contains(cell_geom.boundingBox()):
+                cell_geom = cell_geom.intersection(extent_geom)
+                if cell_geom.isEmpty() or cell_geom.type() != QgsWkbTypes.PolygonGeometry:
+                    continue
+            
+            # Cell vertices are computed circumcenters - snap them to the grid the
+            # blocks are snapped to (see derive_blocks_from_buffer), so the clip
+            # overlay sees coordinates at the same precision on both sides
+            cell_geom = cell_geom.snappedToGrid(SNAP_GRID_METERS, SNAP_GRID_METERS)
+            cell.setGeometry(cell_geom)
+            cells.append(cell)
+        
+        result.dataProvider().addFeatures(cells)
+        result.updateExtents()
+        return result
+
+    def create_polygon_layer(self, crs, fields, name='memory', geometry_type='MultiPolygon'):
+        """Create an empty (Multi)Polygon memory layer with the given CRS and fields"""
+        layer = QgsVectorLayer(geometry_type, name, 'memory')
+        layer.setCrs(crs)
+        layer.dataProvider().addAttributes(fields.toList())
+        layer.updateFields()
+        return layer
 
-    def filter_by_area(self, layer, min_area, max_area):
-        """Filter features by area constraints"""
-        if max_area > 0:
-            expression = f'$area >= {min_area} AND $area <= {max_area}'
-        else:
-            expression = f'$area >= {min_area}'
+    def polygon_geometry(self, geom):
+        """
+        Reduce an overlay result to its polygonal parts as a multipolygon.
         
-        return processing.run('native:extractbyexpression', {
-            'INPUT': layer,
-            'EXPRESSION': expression,
-            'OUTPUT': 'memory:'
-        })['OUTPUT']
+        Returns None if nothing polygonal is left (empty result, or only
+        touching lines/points).
+        """
+        if geom is None or geom.isEmpty():
+            return None
+        
+        if QgsWkbTypes.flatType(geom.wkbType()) == QgsWkbTypes.GeometryCollection:
+            parts = [part for part in geom.asGeometryCollection()
+                     if part.type() == QgsWkbTypes.PolygonGeometry]
+            if not parts:
+                return None
+            geom = QgsGeometry.collectGeometry(parts)
+        elif geom.type() != QgsWkbTypes.PolygonGeometry:
+            return None
+        
+        geom.convertToMultiType()
+        return geom
+
+    def area_in_range(self, area, min_area, max_area):
+        """Check an area against the min/max constraints (max_area 0 = no limit)"""
+        return area >= min_area and (max_area <= 0 or area <= max_area)
 
-    def create_blocks(self, road_layer, buffer_distance, target_crs):
+    def clip_cells_to_block(self, block_geom, cells, min_area, max_area, feedback=None):
+        """
+        Clip Voronoi cells to one block and filter them by area.
+        
+        Runs in a worker thread, so it only reads the block geometry and the
+        cell features it is given and returns its results instead of writing them.
+        
+        Args:
+            block_geom: Block polygon geometry
+            cells: List of Voronoi cell features overlapping the block's bounding box
+            min_area: Minimum area in square meters
+            max_area: Maximum area in square meters (0 = no limit)
+            feedback: Optional QgsFeedback/QgsTask; stops early once it is canceled
+            
+        Returns:
+            Tuple of (list of clipped features within the area range, list of
+            areas of all clipped cells before filtering)
+        """
+        # Prepared engine: fast contains/intersects tests of many cells against the block
+        block_engine = QgsGeometry.createGeometryEngine(block_geom.constGet())
+        block_engine.prepareGeometry()
+        
+        kept = []
+        areas = []
+        for feature in cells:
+            if feedback is not None and feedback.isCanceled():
+                break
+            
+            geom = feature.geometry()
+            if block_engine.contains(geom.constGet()):
+                clipped = QgsGeometry(geom)
+                clipped.convertToMultiType()
+            elif block_engine.intersects(geom.constGet()):
+                clipped = self.polygon_geometry(geom.intersection(block_geom))
+            else:
+                continue
+            
+            # Filter by area
+            if clipped is not None:
+                area = clipped.area()
+                areas.append(area)
+                if self.area_in_range(area, min_area, max_area):
+                    out_feature = QgsFeature(feature)
+                    out_feature.setGeometry(clipped)
+                    kept.append(out_feature)
+        
+        return kept, areas
+
+    def clip_cells(self, voronoi_layer, blocks_layer, min_area, max_area, sink, feedback=None):
+        """
+        Turn Voronoi cells into cadastrals in a single pass.
+        
+        Each cell is clipped to the block(s) it overlaps (preventing cross-block
+        polygons) and kept only if its area is within range. Blocks are the
+        extent minus the road reserve, so clipping to them also subtracts the
+        road reserve. Cells are partitioned by block through a spatial index,
+        clipped in parallel worker threads in chunks of CELLS_PER_TASK cells,
+        and the results are streamed into sink from the calling thread as
+        each task completes.
+        
+        Args:
+            voronoi_layer: Voronoi polygons layer
+            blocks_layer: Block polygons layer
+            min_area: Minimum area in square meters
+            max_area: Maximum area in square meters (0 = no limit)
+            sink: QgsFeatureSink (file writer or memory provider) for the cadastrals
+            feedback: Optional QgsFeedback/QgsTask; the pass stops early once it is canceled
+            
+        Returns:
+            Tuple of (number of cadastrals the sink accepted, list of areas of all
+            clipped cells before filtering, except cells culled by their bounding box)
+        """
+        # A clipped cell is never larger than the cell's bounding box, so cells
+        # whose bounding box is below min_area can be dropped before any clipping
+        cells = {f.id(): f for f in voronoi_layer.getFeatures()
+                 if f.geometry().boundingBox().area() >= min_area}
+        cell_index = QgsSpatialIndex()
+        cell_index.addFeatures(list(cells.values()))
+        
+        count = 0
+        areas = []
+        rejected = 0
+        error = None
+        with ThreadPoolExecutor(max_workers=WORKER_THREADS) as executor:
+            futures = set()
+            for block in blocks_layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+                block_geom = block.geometry()
+                block_cells = [cells[cell_id]
+                               for cell_id in cell_index.intersects(block_geom.boundingBox())]
+                for start in range(0, len(block_cells), CELLS_PER_TASK):
+                    futures.add(executor.submit(
+                        self.clip_cells_to_block, block_geom,
+                        block_cells[start:start + CELLS_PER_TASK], min_area, max_area, feedback
+                    ))
+            
+            for future in as_completed(futures):
+                if feedback is not None and feedback.isCanceled():
+                    for pending in futures:
+                        pending.cancel()
+                    break
+                
+                kept, block_areas = future.result()
+                # Drop the finished future so its results can be freed once written
+                futures.discard(future)
+                written, block_error = self.write_features(sink, kept)
+                count += written
+                rejected += len(kept) - written
+                error = block_error or error
+                areas.extend(block_areas)
+        
+        if rejected:
+            self.log_message(f"{rejected} cadastrals could not be written: {error}", Qgis.Warning)
+        
+        return count, areas
+
+    def write_features(self, sink, features):
+        """Add features to a sink one at a time; returns (number written, last error or None)"""
+        # A GeoPackage writer stops at the first feature it cannot insert (e.g. a
+        # duplicate fid), so a whole-batch result would not say how many made it
+        written = 0
+        error = None
+        for feature in features:
+            result = sink.addFeatures([feature])
+            # Data providers return (ok, features), file writers a plain ok
+            ok = result[0] if isinstance(result, tuple) else result
+            if ok:
+                written += 1
+            else:
+                error = sink.lastError()
+        return written, error
+
+    def block_extent(self, roads_projected, buffer_distance):
+        """Extent covered by the blocks: the centerlines' extent grown by the buffer plus padding"""
+        # The buffer's extent is the centerlines' extent grown by the buffer
+        # distance - much cheaper than scanning the buffer polygons
+        extent = roads_projected.extent()
+        extent.grow(buffer_distance + buffer_distance * 5)
+        return extent
+
+    def create_blocks(self, road_layer, buffer_distance, target_crs, min_area=0, max_area=0):
         """
         Create blocks (outer boundaries only) by buffering roads and 
         extracting the negative space.
@@ -172,9 +406,11 @@ class CadastralAutomation:
             road_layer: Road centerlines layer
             buffer_distance: Buffer distance in meters
             target_crs: Target CRS for processing
+            min_area: Minimum block area in square meters (0 = no limit)
+            max_area: Maximum block area in square meters (0 = no limit)
             
         Returns:
-            QgsVectorLayer: Block polygons
+            QgsVectorLayer: Block polygons within the area range
         """
         self.log_message("Creating blocks from road network...")
         
@@ -184,41 +420,56 @@ class CadastralAutomation:
         # Buffer roads
         road_buffer = self.buffer_roads(roads_projected, buffer_distance)
         
-        # Get extent of road buffer
-        extent = road_buffer.extent()
-        
-        # Create a bounding polygon from extent with some padding
-        padding = buffer_distance * 5
-        extent.grow(padding)
+        return self.derive_blocks_from_buffer(
+            road_buffer,
+            self.block_extent(roads_projected, buffer_distance),
+            min_area,
+            max_area
+        )
+
+    def derive_blocks_from_buffer(self, road_buffer, extent, min_area=0, max_area=0):
+        """
+        Derive blocks from an existing road buffer: the parts of extent
+        outside the road reserve.
         
+        Args:
+            road_buffer: Dissolved road buffer layer
+            extent: QgsRectangle the blocks are cut from
+            min_area: Minimum block area in square meters (0 = no limit)
+            max_area: Maximum block area in square meters (0 = no limit)
+            
+        Returns:
+            QgsVectorLayer: Block polygons within the area range
+        """
         # Create extent polygon
-        from qgis.core import QgsGeometry, QgsFeature, QgsFields
-        extent_geom = QgsGeometry.fromRect(extent)
-        
-        extent_layer = QgsVectorLayer('Polygon?crs=' + target_crs.authid(), 'extent', 'memory')
-        extent_provider = extent_layer.dataProvider()
-        extent_feature = QgsFeature()
-        extent_feature.setGeometry(extent_geom)
-        extent_provider.addFeatures([extent_feature])
-        extent_layer.updateExtents()
-        
-        # Subtract road buffer from extent to get blocks
-        blocks = processing.run('native:difference', {
-            'INPUT': extent_layer,
-            'OVERLAY': road_buffer,
-            'OUTPUT': 'memory:'
-        })['OUTPUT']
+        extent_geom = QgsGeometry.fromRect(extent).snappedToGrid(SNAP_GRID_METERS, SNAP_GRID_METERS)
         
-        # Multipart to singleparts to separate individual blocks
-        blocks = processing.run('native:multiparttosingleparts', {
-            'INPUT': blocks,
-            'OUTPUT': 'memory:'
-        })['OUTPUT']
+        # Blocks are the extent minus the road reserve, one GEOS overlay
+        road_geom = self.dissolve_geometry(road_buffer)
+        negative_space = self.polygon_geometry(extent_geom.difference(road_geom))
+        
+        blocks = self.create_polygon_layer(road_buffer.crs(), QgsFields(), 'blocks', 'Polygon')
+        block_features = []
+        parts = negative_space.asGeometryCollection() if negative_space is not None else []
+        for part in parts:
+            if not self.area_in_range(part.area(), min_area, max_area):
+                continue
+            # Snap to the grid the Voronoi cells are snapped to, unless that
+            # would leave the block invalid for the clip overlay
+            snapped = part.snappedToGrid(SNAP_GRID_METERS, SNAP_GRID_METERS)
+            if snapped.isGeosValid():
+                part = snapped
+            block = QgsFeature(blocks.fields())
+            block.setGeometry(part)
+            block_features.append(block)
+        blocks.dataProvider().addFeatures(block_features)
+        blocks.updateExtents()
         
         return blocks
 
     def generate_cadastrals(self, centerline_layer, point_layer, buffer_distance, 
-                          min_area, max_area, target_crs, blocks_mode=False, progress_callback=None):
+                          min_area, max_area, target_crs, blocks_mode=False, progress_callback=None,
+                          output_path=None, feedback=None):
         """
         Main processing function to generate cadastrals or blocks
         
@@ -231,9 +482,13 @@ class CadastralAutomation:
             target_crs: Target CRS for processing
             blocks_mode: If True, create only outer boundaries (blocks)
             progress_callback: Optional callback function(step, message) for progress updates
+            output_path: Optional GeoPackage path; in cadastral mode features are
+                written straight to it instead of to a memory layer
+            feedback: Optional QgsFeedback/QgsTask checked between steps for cancellation
             
         Returns:
-            QgsVectorLayer: Generated cadastrals or blocks
+            QgsVectorLayer: Generated cadastrals or blocks (file-backed if written
+            to output_path, otherwise a memory layer), or None if canceled
         """
         def update_progress(step, message):
             """Helper to update progress"""
@@ -241,25 +496,38 @@ class CadastralAutomation:
             if progress_callback:
                 progress_callback(step, message)
         
+        def canceled():
+            """Helper to check whether processing should stop"""
+            if feedback is not None and feedback.isCanceled():
+                self.log_message("Processing cancelled by user", Qgis.Warning)
+                return True
+            return False
+        
         try:
             if blocks_mode:
                 # Blocks mode - create outer boundaries only
-                total_steps = 4
+                total_steps = 3
                 update_progress(1, "Running in BLOCKS MODE - creating outer boundaries only")
                 
-                update_progress(2, "Buffering roads and creating blocks...")
-                result = self.create_blocks(centerline_layer, buffer_distance, target_crs)
+                # Blocks are filtered by area as they are created
+                update_progress(
+                    2, f"Buffering roads and creating blocks ({min_area}-{max_area} m²)...")
+                result = self.create_blocks(
+                    centerline_layer,
+                    buffer_distance,
+                    target_crs,
+                    min_area=min_area,
+                    max_area=max_area
+                )
                 
-                # Filter by area
-                if min_area > 0 or max_area > 0:
-                    update_progress(3, f"Filtering by area ({min_area}-{max_area} m²)...")
-                    result = self.filter_by_area(result, min_area, max_area)
+                if canceled():
+                    return None
                 
-                update_progress(4, f"Blocks created: {result.featureCount()} features")
+                update_progress(3, f"Blocks created: {result.featureCount()} features")
                 
             else:
                 # Normal mode - create individual cadastrals
-                total_steps = 9
+                total_steps = 7
                 update_progress(1, "Running in CADASTRAL MODE - creating individual cadastrals")
                 
                 if not point_layer:
@@ -270,16 +538,31 @@ class CadastralAutomation:
                 roads_projected = self.reproject_layer(centerline_layer, target_crs)
                 buildings_projected = self.reproject_layer(point_layer, target_crs)
                 
+                if canceled():
+                    return None
+                
                 # Buffer roads to create blocks
                 update_progress(3, f"Buffering roads by {buffer_distance}m...")
                 road_buffer = self.buffer_roads(roads_projected, buffer_distance)
                 
+                # Drop points far from the road network - their cells would be
+                # discarded by the block intersection anyway
+                search_extent = roads_projected.extent()
+                search_extent.grow(buffer_distance + buffer_distance * 10)
+                buildings_projected = self.extract_points_in_extent(buildings_projected, search_extent)
+                
+                if canceled():
+                    return None
+                
                 # Create Voronoi polygons
                 update_progress(4, "Creating Voronoi polygons from points...")
-                voronoi = self.create_voronoi_polygons(buildings_projected)
+                extent = self.block_extent(roads_projected, buffer_distance)
+                voronoi = self.create_voronoi_polygons(buildings_projected, extent)
                 
-                # Check if all points got polygons
-                point_count = buildings_projected.featureCount()
+                # Check if all points got polygons - only those inside the block
+                # extent are sure to, the others may lie wholly outside it
+                point_count = sum(1 for _ in buildings_projected.getFeatures(
+                    QgsFeatureRequest().setFilterRect(extent).setNoAttributes()))
                 voronoi_count = voronoi.featureCount()
                 self.log_message(f"Points: {point_count}, Voronoi polygons: {voronoi_count}")
                 
@@ -290,25 +573,54 @@ class CadastralAutomation:
                         Qgis.Warning
                     )
                 
-                # Subtract roads from Voronoi
-                update_progress(5, "Subtracting road reserves from cadastrals...")
-                cadastrals = self.subtract_roads(voronoi, road_buffer)
+                if canceled():
+                    return None
                 
                 # Create blocks (negative space of roads)
-                update_progress(6, "Creating blocks from road network...")
-                blocks = self.create_blocks(centerline_layer, buffer_distance, target_crs)
+                update_progress(5, "Creating blocks from road network...")
+                blocks = self.derive_blocks_from_buffer(road_buffer, extent)
                 self.log_message(f"Blocks created: {blocks.featureCount()} features")
                 
-                # Intersect with blocks to ensure cadastrals stay within their block
-                update_progress(7, "Intersecting cadastrals with blocks (prevents cross-block polygons)...")
-                cadastrals_blocked = self.intersect_with_blocks(cadastrals, blocks)
-                self.log_message(f"After intersection with blocks: {cadastrals_blocked.featureCount()} features")
+                if canceled():
+                    return None
+                
+                # Intersect with blocks (prevents cross-block polygons and subtracts
+                # road reserves) and filter by area in one pass
+                update_progress(
+                    6,
+                    f"Subtracting road reserves, clipping to blocks and filtering by area "
+                    f"({min_area}-{max_area} m²)..."
+                )
+                writer = None
+                if output_path:
+                    writer = self.create_output_writer(output_path, voronoi.fields(), voronoi.crs())
+                    if writer.hasError() != QgsVectorFileWriter.NoError:
+                        self.log_message(
+                            f"Warning: Could not open {output_path} for writing "
+                            f"({writer.errorMessage()}), using a temporary layer",
+                            Qgis.Warning
+                        )
+                        writer = None
+                
+                if writer is None:
+                    result = self.create_polygon_layer(voronoi.crs(), voronoi.fields(), 'Cadastrals')
+                    count, areas = self.clip_cells(
+                        voronoi, blocks, min_area, max_area, result.dataProvider(), feedback)
+                    result.updateExtents()
+                else:
+                    count, areas = self.clip_cells(
+                        voronoi, blocks, min_area, max_area, writer, feedback)
+                    del writer  # Flush and close the output file
+                    result = QgsVectorLayer(output_path, 'Cadastrals', 'ogr')
                 
-                # Filter by area
-                update_progress(8, f"Filtering by area ({min_area}-{max_area} m²)...")
-                result = self.filter_by_area(cadastrals_blocked, min_area, max_area)
+                if canceled():
+                    return None
+                self.log_message(
+                    f"After intersection with blocks: {len(areas)} features "
+                    f"(excluding cells already below {min_area} m²)"
+                )
                 
-                update_progress(9, f"Cadastrals created: {result.featureCount()} features")
+                update_progress(7, f"Cadastrals created: {count} features")
             
             return result
             
@@ -316,30 +628,63 @@ class CadastralAutomation:
             self.log_message(f"Error during processing: {str(e)}", Qgis.Critical)
             raise
 
+    def create_output_writer(self, output_path, fields, crs):
+        """Open a GeoPackage writer for streaming MultiPolygon features to output_path"""
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = 'GPKG'
+        options.fileEncoding = 'UTF-8'
+        # The spatial index is built in one go by save_layer once all features are in
+        options.layerOptions = ['SPATIAL_INDEX=NO']
+        return QgsVectorFileWriter.create(
+            output_path,
+            fields,
+            QgsWkbTypes.MultiPolygon,
+            crs,
+            QgsProject.instance().transformContext(),
+            options
+        )
+
     def save_layer(self, layer, output_path, layer_name='Cadastrals'):
-        """Save layer to file and add to QGIS project"""
-        error = QgsVectorFileWriter.writeAsVectorFormat(
+        """Save layer to file (the caller adds the returned layer to the project)"""
+        if layer.providerType() != 'memory':
+            # Already written to output_path while processing
+            layer.setName(layer_name)
+            layer.dataProvider().createSpatialIndex()
+            return layer
+        
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = 'GPKG'
+        options.fileEncoding = 'UTF-8'
+        # Bulk insert without maintaining the R-tree, then build it once below
+        options.layerOptions = ['SPATIAL_INDEX=NO']
+        error = QgsVectorFileWriter.writeAsVectorFormatV3(
             layer,
             output_path,
-            "UTF-8",
-            layer.crs(),
-            "GPKG"
+            QgsProject.instance().transformContext(),
+            options
         )
         
         if error[0] != QgsVectorFileWriter.NoError:
             self.log_message(f"Warning: Could not save to file ({error})", Qgis.Warning)
             self.log_message("Adding as temporary layer instead", Qgis.Warning)
-            QgsProject.instance().addMapLayer(layer)
             return layer
         
-        # Load saved layer and add to project
+        # Load saved layer and index it
         saved_layer = QgsVectorLayer(output_path, layer_name, 'ogr')
-        QgsProject.instance().addMapLayer(saved_layer)
+        saved_layer.dataProvider().createSpatialIndex()
         return saved_layer
 
     def run(self):
         """Run method that performs all the real work"""
         
+        if self.task is not None:
+            QMessageBox.information(
+                self.iface.mainWindow(),
+                "Cadastral Automation",
+                "Processing is already running. Please wait for it to finish."
+            )
+            return
+        
         # Create the dialog with elements (after translation) and keep reference
         # Only create GUI ONCE in callback, so that it will only load when the plugin is started
         if self.dlg is None:
@@ -357,8 +702,7 @@ class CadastralAutomation:
             buffer_distance = self.dlg.doubleSpinBox_buffer.value()
             min_area = self.dlg.doubleSpinBox_min_area.value()
             max_area = self.dlg.doubleSpinBox_max_area.value()
-            target_crs_str = self.dlg.mQgsProjectionSelectionWidget.crs().authid()
-            target_crs = QgsCoordinateReferenceSystem(target_crs_str)
+            target_crs = self.dlg.mQgsProjectionSelectionWidget.crs()
             output_path = self.dlg.mQgsFileWidget_output.filePath()
             blocks_mode = self.dlg.checkBox_blocks_mode.isChecked()
             
@@ -420,95 +764,128 @@ class CadastralAutomation:
                 )
                 return
             
-            # Run processing with progress dialog
-            try:
-                self.log_message("=" * 70)
-                self.log_message("CADASTRAL AUTOMATION - PROCESSING STARTED")
-                self.log_message("=" * 70)
-                
-                # Create progress dialog
-                total_steps = 4 if blocks_mode else 9
-                progress = QProgressDialog(
-                    "Initializing...", 
-                    "Cancel", 
-                    0, 
-                    total_steps + 2,  # +2 for save and finalize
-                    self.iface.mainWindow()
-                )
-                progress.setWindowTitle("Cadastral Automation")
-                progress.setMinimumDuration(0)
-                progress.setValue(0)
-                progress.show()
-                
-                # Progress callback function
-                def update_progress(step, message):
-                    if progress.wasCanceled():
-                        raise Exception("Processing cancelled by user")
-                    progress.setValue(step)
-                    progress.setLabelText(message)
-                    QCoreApplication.processEvents()  # Keep UI responsive
-                
-                # Generate cadastrals/blocks
-                result_layer = self.generate_cadastrals(
-                    centerline_layer,
-                    point_layer,
-                    buffer_distance,
-                    min_area,
-                    max_area,
-                    target_crs,
-                    blocks_mode,
-                    progress_callback=update_progress
-                )
-                
-                # Save result
-                layer_name = 'Blocks' if blocks_mode else 'Cadastrals'
-                progress.setValue(total_steps + 1)
-                progress.setLabelText(f"Saving to {output_path}...")
-                QCoreApplication.processEvents()
-                
-                self.log_message(f"Saving to {output_path}...")
-                saved_layer = self.save_layer(result_layer, output_path, layer_name)
-                
-                # Finalize
-                progress.setValue(total_steps + 2)
-                progress.setLabelText("Finalizing...")
-                QCoreApplication.processEvents()
-                
-                self.log_message("=" * 70)
-                self.log_message("PROCESSING COMPLETED SUCCESSFULLY")
-                self.log_message("=" * 70)
-                
-                # Close progress dialog
-                progress.close()
-                
-                # Show success message
-                self.iface.messageBar().pushMessage(
-                    "Success",
-                    f"{layer_name} generated: {saved_layer.featureCount()} features created",
-                    level=Qgis.Success,
-                    duration=5
-                )
-                
-                QMessageBox.information(
-                    self.iface.mainWindow(),
-                    "Success",
-                    f"{layer_name} generated successfully!\n\n"
-                    f"Features created: {saved_layer.featureCount()}\n"
-                    f"Saved to: {output_path}"
-                )
-                
-                # Zoom to layer
-                self.iface.mapCanvas().setExtent(saved_layer.extent())
-                self.iface.mapCanvas().refresh()
-                
-            except Exception as e:
-                # Close progress dialog if it exists
-                if 'progress' in locals():
-                    progress.close()
-                
-                self.log_message(f"Processing failed: {str(e)}", Qgis.Critical)
-                QMessageBox.critical(
-                    self.iface.mainWindow(),
-                    "Processing Error",
-                    f"An error occurred during processing:\n\n{str(e)}"
-                )
+            # Run processing in a background task with a progress dialog
+            self.log_message("=" * 70)
+            self.log_message("CADASTRAL AUTOMATION - PROCESSING STARTED")
+            self.log_message("=" * 70)
+            
+            # Create progress dialog
+            total_steps = 3 if blocks_mode else 7
+            progress = QProgressDialog(
+                "Initializing...", 
+                "Cancel", 
+                0, 
+                total_steps + 2,  # +2 for save and finalize
+                self.iface.mainWindow()
+            )
+            progress.setWindowTitle("Cadastral Automation")
+            progress.setMinimumDuration(0)
+            progress.setValue(0)
+            progress.show()
+            
+            # Progress slot - the task emits stepChanged from its worker thread,
+            # which Qt queues onto the GUI thread
+            def update_progress(step, message):
+                progress.setValue(step)
+                progress.setLabelText(message)
+            
+            # Project layers must not be read from the task's worker thread, so
+            # the task reopens file-backed inputs from their source; only memory
+            # layers and layers with unsaved edits are copied here
+            centerline_input = detach_layer(centerline_layer)
+            point_input = None
+            if not blocks_mode:
+                point_input = detach_layer(point_layer)
+            
+            layer_name = 'Blocks' if blocks_mode else 'Cadastrals'
+            task = CadastralTask(
+                self,
+                total_steps,
+                centerline_layer=centerline_input,
+                point_layer=point_input,
+                buffer_distance=buffer_distance,
+                min_area=min_area,
+                max_area=max_area,
+                target_crs=target_crs,
+                blocks_mode=blocks_mode,
+                output_path=output_path
+            )
+            # Queued so the dialog is only ever touched from the main thread
+            task.stepChanged.connect(update_progress, Qt.QueuedConnection)
+            progress.canceled.connect(task.cancel)
+            task.taskCompleted.connect(
+                lambda: self.finish_processing(task, progress, total_steps, output_path, layer_name)
+            )
+            task.taskTerminated.connect(lambda: self.processing_failed(task, progress))
+            
+            # Keep a reference so the task is not garbage collected while running
+            self.task = task
+            QgsApplication.taskManager().addTask(task)
+
+    def finish_processing(self, task, progress, total_steps, output_path, layer_name):
+        """Save the task's result and report success (runs on the GUI thread)"""
+        self.task = None
+        try:
+            # Save result
+            progress.setValue(total_steps + 1)
+            progress.setLabelText(f"Saving to {output_path}...")
+            
+            self.log_message(f"Saving to {output_path}...")
+            saved_layer = self.save_layer(task.result_layer, output_path, layer_name)
+            QgsProject.instance().addMapLayers([saved_layer])
+            
+            # Finalize
+            progress.setValue(total_steps + 2)
+            progress.setLabelText("Finalizing...")
+            
+            self.log_message("=" * 70)
+            self.log_message("PROCESSING COMPLETED SUCCESSFULLY")
+            self.log_message("=" * 70)
+            
+            # Close progress dialog
+            progress.close()
+            
+            # Show success message
+            feature_count = saved_layer.featureCount()
+            self.iface.messageBar().pushMessage(
+                "Success",
+                f"{layer_name} generated: {feature_count} features created",
+                level=Qgis.Success,
+                duration=5
+            )
+            
+            QMessageBox.information(
+                self.iface.mainWindow(),
+                "Success",
+                f"{layer_name} generated successfully!\n\n"
+                f"Features created: {feature_count}\n"
+                f"Saved to: {output_path}"
+            )
+            
+            # Zoom to layer
+            self.iface.mapCanvas().setExtent(saved_layer.extent())
+            self.iface.mapCanvas().refresh()
+            
+        except Exception as e:
+            progress.close()
+            self.show_processing_error(e)
+
+    def processing_failed(self, task, progress):
+        """Report a failed or cancelled task (runs on the GUI thread)"""
+        self.task = None
+        progress.close()
+        
+        if task.exception is None:
+            self.log_message("Processing cancelled", Qgis.Warning)
+            return
+        
+        self.show_processing_error(task.exception)
+
+    def show_processing_error(self, error):
+        """Log a processing error and show it to the user"""
+        self.log_message(f"Processing failed: {str(error)}", Qgis.Critical)
+        QMessageBox.critical(
+            self.iface.mainWindow(),
+            "Processing Error",
+            f"An error occurred during processing:\n\n{str(error)}"
+        )
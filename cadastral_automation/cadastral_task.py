@@ -0,0 +1,93 @@
+"""
+Background task for Cadastral Automation plugin
+"""
+
+from qgis.PyQt.QtCore import QCoreApplication, pyqtSignal
+from qgis.core import QgsFeatureRequest, QgsTask, QgsVectorLayer
+
+
+class LayerSource:
+    """Data source of a file-backed input layer, reopened inside the task"""
+
+    def __init__(self, layer):
+        """Constructor (call from the main thread).
+
+        Args:
+            layer: Project layer to take the source, provider and CRS from
+        """
+        self.source = layer.source()
+        self.name = layer.name()
+        self.provider = layer.providerType()
+        self.crs = layer.crs()
+
+    def open(self):
+        """Open a new layer on the source (runs in the task's worker thread)"""
+        layer = QgsVectorLayer(self.source, self.name, self.provider)
+        if not layer.isValid():
+            raise ValueError(f"Could not open layer '{self.name}' from {self.source}")
+        layer.setCrs(self.crs)
+        return layer
+
+
+def detach_layer(layer):
+    """Prepare a project layer for use by the task (call from the main thread).
+
+    File-backed layers are passed as a LayerSource, so their features are only
+    read in the worker thread. Memory layers and layers with unsaved edits
+    cannot be reopened from their source and are copied to a detached memory
+    layer instead.
+    """
+    if layer.providerType() == 'memory' or layer.isModified():
+        return layer.materialize(QgsFeatureRequest())
+    return LayerSource(layer)
+
+
+class CadastralTask(QgsTask):
+    """Runs CadastralAutomation.generate_cadastrals off the GUI thread"""
+
+    # Emitted with (step, message) for every processing step
+    stepChanged = pyqtSignal(int, str)
+
+    def __init__(self, plugin, total_steps, **params):
+        """Constructor.
+
+        Args:
+            plugin: CadastralAutomation instance doing the processing
+            total_steps: Number of steps reported by generate_cadastrals
+            **params: Keyword arguments for generate_cadastrals
+        """
+        super(CadastralTask, self).__init__('Cadastral Automation', QgsTask.CanCancel)
+        self.plugin = plugin
+        self.total_steps = total_steps
+        self.params = params
+
+        self.result_layer = None
+        self.exception = None
+
+    def report_step(self, step, message):
+        """Progress callback passed to generate_cadastrals"""
+        self.setProgress(100.0 * step / self.total_steps)
+        self.stepChanged.emit(step, message)
+
+    def run(self):
+        """Generate cadastrals/blocks (runs in a worker thread)"""
+        try:
+            params = {
+                key: value.open() if isinstance(value, LayerSource) else value
+                for key, value in self.params.items()
+            }
+            self.result_layer = self.plugin.generate_cadastrals(
+                progress_callback=self.report_step,
+                feedback=self,
+                **params
+            )
+        except Exception as e:
+            self.exception = e
+            return False
+
+        if self.result_layer is None:
+            return False
+
+        # Hand the layer over to the main thread so it can be added to the project
+        self.result_layer.moveToThread(QCoreApplication.instance().thread())
+        return True
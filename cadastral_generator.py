@@ -14,11 +14,23 @@ Usage:
 """
 
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from typing import Optional, Tuple
 from qgis.core import (
     QgsProject,
+    QgsCoordinateReferenceSystem,
     QgsVectorLayer,
-    QgsVectorFileWriter
+    QgsVectorFileWriter,
+    QgsReferencedRectangle,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsFields,
+    QgsGeometry,
+    QgsSpatialIndex,
+    QgsWkbTypes,
+    QgsPointXY
 )
 from qgis import processing
 
@@ -29,6 +41,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Number of worker threads used to clip Voronoi cells to blocks
+WORKER_THREADS = os.cpu_count() or 1
+
+# Cells handed to a worker thread at a time. Large blocks (notably the one
+# around the outside of the network) are split into several tasks so one
+# block can't leave the other workers idle
+CELLS_PER_TASK = 500
+
+# Grid (in target CRS units, i.e. meters) that block and Voronoi cell vertices
+# are snapped to, so the clip overlay between them doesn't produce slivers from
+# sub-millimeter coordinate noise
+SNAP_GRID_METERS = 0.001
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 # CONFIGURATION
@@ -88,18 +113,41 @@ def get_layers(road_name: str, building_name: str) -> Tuple[Optional[QgsVectorLa
     building_layers = project.mapLayersByName(building_name)
     
     if not road_layers:
-        print(f"❌ ERROR: Road layer '{road_name}' not found!")
-        print(f"Available layers: {[l.name() for l in project.mapLayers().values()]}")
+        logger.error(
+            "Road layer '%s' not found! Available layers: %s",
+            road_name,
+            [l.name() for l in project.mapLayers().values()]
+        )
         return None, None
     
     if not building_layers:
-        print(f"❌ ERROR: Building layer '{building_name}' not found!")
-        print(f"Available layers: {[l.name() for l in project.mapLayers().values()]}")
+        logger.error(
+            "Building layer '%s' not found! Available layers: %s",
+            building_name,
+            [l.name() for l in project.mapLayers().values()]
+        )
         return None, None
     
     return road_layers[0], building_layers[0]
 
 
+@lru_cache(maxsize=16)
+def crs_from_authid(authid: str) -> QgsCoordinateReferenceSystem:
+    """
+    Build a CRS from its authority id, once per id
+    
+    Creating a QgsCoordinateReferenceSystem queries the PROJ database, so
+    the result is cached and shared by every reprojection to the same CRS.
+    
+    Args:
+        authid: CRS authority id (e.g., 'EPSG:32736')
+        
+    Returns:
+        QgsCoordinateReferenceSystem: The CRS
+    """
+    return QgsCoordinateReferenceSystem(authid)
+
+
 def reproject_layer(layer: QgsVectorLayer, target_crs: str) -> QgsVectorLayer:
     """
     Reproject layer to target CRS
@@ -109,11 +157,14 @@ def reproject_layer(layer: QgsVectorLayer, target_crs: str) -> QgsVectorLayer:
         target_crs: Target CRS (e.g., 'EPSG:32736')
         
     Returns:
-        Reprojected layer
+        Reprojected layer (the input layer itself if already in target CRS)
     """
+    if layer.crs().authid() == target_crs:
+        return layer
+    
     return processing.run('native:reprojectlayer', {
         'INPUT': layer,
-        'TARGET_CRS': target_crs,
+        'TARGET_CRS': crs_from_authid(target_crs),
         'OUTPUT': 'memory:'
     })['OUTPUT']
 
@@ -140,136 +191,392 @@ def buffer_roads(road_layer, buffer_distance):
     })['OUTPUT']
 
 
-def create_voronoi_polygons(building_layer):
+def dissolve_geometry(layer):
+    """
+    Union all geometries of a layer into a single geometry
+    
+    Args:
+        layer: QgsVectorLayer to dissolve
+        
+    Returns:
+        QgsGeometry: Unioned geometry
+    """
+    geometries = [f.geometry() for f in layer.getFeatures(QgsFeatureRequest().setNoAttributes())]
+    if len(geometries) == 1:
+        # Already dissolved (e.g. buffer_roads output)
+        return geometries[0]
+    return QgsGeometry.unaryUnion(geometries)
+
+
+def extract_points_in_extent(point_layer, extent):
+    """
+    Keep only the points that fall inside an extent
+    
+    Args:
+        point_layer: QgsVectorLayer with building points
+        extent: QgsRectangle in the point layer's CRS
+        
+    Returns:
+        QgsVectorLayer: Points inside the extent
+    """
+    return processing.run('native:extractbyextent', {
+        'INPUT': point_layer,
+        'EXTENT': QgsReferencedRectangle(extent, point_layer.crs()),
+        'CLIP': False,
+        'OUTPUT': 'memory:'
+    })['OUTPUT']
+
+
+def create_voronoi_polygons(building_layer, extent=None):
     """
     Create Voronoi (Thiessen) polygons from building points
     
+    Uses the GEOS Voronoi builder directly; each cell carries the
+    attributes of the building point it contains.
+    
     Args:
         building_layer: QgsVectorLayer with building points
+        extent: Optional QgsRectangle to cut the cells to (see block_extent);
+            cells wholly outside it are dropped
         
     Returns:
         QgsVectorLayer: Voronoi polygons
     """
-    return processing.run('qgis:voronoipolygons', {
-        'INPUT': building_layer,
-        'BUFFER': 30,  # 30% buffer around extent to ensure all points get polygons
-        'OUTPUT': 'memory:'
-    })['OUTPUT']
+    # Read the buildings once; the same features feed the diagram and the index
+    buildings = {f.id(): f for f in building_layer.getFeatures()}
+    points = QgsGeometry.fromMultiPointXY([
+        QgsPointXY(vertex)
+        for f in buildings.values()
+        for vertex in f.geometry().vertices()
+    ])
+    result = create_polygon_layer(
+        building_layer.crs(), building_layer.fields(), 'voronoi', 'Polygon')
+    if points.isEmpty():
+        return result
+    
+    # GEOS bounds the diagram by the points' envelope grown by its larger side
+    diagram = points.voronoiDiagram()
+    
+    # GEOS returns the cells unordered - find each cell's point to copy its attributes
+    index = QgsSpatialIndex(QgsSpatialIndex.FlagStoreFeatureGeometries)
+    index.addFeatures(list(buildings.values()))
+    extent_geom = QgsGeometry.fromRect(extent) if extent is not None else None
+    cells = []
+    for cell_geom in diagram.asGeometryCollection():
+        cell = QgsFeature(result.fields())
+        for building_id in index.intersects(cell_geom.boundingBox()):
+            if cell_geom.intersects(index.geometry(building_id)):
+                cell.setAttributes(buildings[building_id].attributes())
+                break
+        
+        # The outer cells reach far beyond the blocks - cut them down before
+        # they go through the area cull and the clip
+        if extent_geom is not None and not extent.contains(cell_geom.boundingBox()):
+            cell_geom = cell_geom.intersection(extent_geom)
+            if cell_geom.isEmpty() or cell_geom.type() != QgsWkbTypes.PolygonGeometry:
+                continue
+        
+        # Cell vertices are computed circumcenters - snap them to the grid the
+        # blocks are snapped to (see derive_blocks_from_buffer), so the clip
+        # overlay sees coordinates at the same precision on both sides
+        cell_geom = cell_geom.snappedToGrid(SNAP_GRID_METERS, SNAP_GRID_METERS)
+        cell.setGeometry(cell_geom)
+        cells.append(cell)
+    
+    result.dataProvider().addFeatures(cells)
+    result.updateExtents()
+    return result
 
 
-def create_blocks(road_layer, buffer_distance, target_crs):
+def block_extent(roads_projected, buffer_distance):
     """
-    Create blocks (negative space of roads)
+    Extent covered by the blocks
+    
+    The buffer's extent is the centerlines' extent grown by the buffer
+    distance - much cheaper than scanning the buffer polygons.
     
     Args:
-        road_layer: QgsVectorLayer with road centerlines
+        roads_projected: QgsVectorLayer with road centerlines in the target CRS
         buffer_distance (float): Buffer distance in meters
-        target_crs (str): Target CRS
         
     Returns:
-        QgsVectorLayer: Block polygons
+        QgsRectangle: Centerline extent grown by the buffer plus padding
     """
-    # Reproject and buffer roads
-    roads_projected = reproject_layer(road_layer, target_crs)
-    road_buffer = buffer_roads(roads_projected, buffer_distance)
-    
-    # Get extent with padding
-    extent = road_buffer.extent()
-    padding = buffer_distance * 5
-    extent.grow(padding)
+    extent = roads_projected.extent()
+    extent.grow(buffer_distance + buffer_distance * 5)
+    return extent
+
+
+def derive_blocks_from_buffer(road_buffer, extent, min_area=0, max_area=0):
+    """
+    Derive blocks from an existing road buffer
     
+    Args:
+        road_buffer: QgsVectorLayer with the dissolved road buffer
+        extent: QgsRectangle the blocks are cut from
+        min_area (float): Minimum block area in square meters (0 = no limit)
+        max_area (float): Maximum block area in square meters (0 = no limit)
+        
+    Returns:
+        QgsVectorLayer: Parts of extent outside the road reserve, within the area range
+    """
     # Create extent polygon
-    from qgis.core import QgsGeometry, QgsFeature, QgsCoordinateReferenceSystem
-    extent_geom = QgsGeometry.fromRect(extent)
-    
-    extent_layer = QgsVectorLayer('Polygon?crs=' + target_crs, 'extent', 'memory')
-    extent_provider = extent_layer.dataProvider()
-    extent_feature = QgsFeature()
-    extent_feature.setGeometry(extent_geom)
-    extent_provider.addFeatures([extent_feature])
-    extent_layer.updateExtents()
-    
-    # Subtract road buffer from extent to get blocks
-    blocks = processing.run('native:difference', {
-        'INPUT': extent_layer,
-        'OVERLAY': road_buffer,
-        'OUTPUT': 'memory:'
-    })['OUTPUT']
-    
-    # Multipart to singleparts
-    blocks = processing.run('native:multiparttosingleparts', {
-        'INPUT': blocks,
-        'OUTPUT': 'memory:'
-    })['OUTPUT']
+    extent_geom = QgsGeometry.fromRect(extent).snappedToGrid(SNAP_GRID_METERS, SNAP_GRID_METERS)
+    
+    # Blocks are the extent minus the road reserve, one GEOS overlay
+    road_geom = dissolve_geometry(road_buffer)
+    negative_space = polygon_geometry(extent_geom.difference(road_geom))
+    
+    blocks = create_polygon_layer(road_buffer.crs(), QgsFields(), 'blocks', 'Polygon')
+    block_features = []
+    parts = negative_space.asGeometryCollection() if negative_space is not None else []
+    for part in parts:
+        if not area_in_range(part.area(), min_area, max_area):
+            continue
+        # Snap to the grid the Voronoi cells are snapped to, unless that
+        # would leave the block invalid for the clip overlay
+        snapped = part.snappedToGrid(SNAP_GRID_METERS, SNAP_GRID_METERS)
+        if snapped.isGeosValid():
+            part = snapped
+        block = QgsFeature(blocks.fields())
+        block.setGeometry(part)
+        block_features.append(block)
+    blocks.dataProvider().addFeatures(block_features)
+    blocks.updateExtents()
     
     return blocks
 
 
-def intersect_with_blocks(cadastral_layer, blocks_layer):
+def create_polygon_layer(crs, fields, name='memory', geometry_type='MultiPolygon'):
     """
-    Intersect cadastral polygons with block boundaries to prevent cross-block polygons
+    Create an empty polygon memory layer
     
     Args:
-        cadastral_layer: QgsVectorLayer with cadastral polygons
-        blocks_layer: QgsVectorLayer with block polygons
+        crs: QgsCoordinateReferenceSystem for the layer
+        fields: QgsFields to add to the layer
+        name (str): Layer name
+        geometry_type (str): 'MultiPolygon' or 'Polygon'
         
     Returns:
-        QgsVectorLayer: Cadastrals intersected with blocks
+        QgsVectorLayer: Empty memory layer
     """
-    return processing.run('native:intersection', {
-        'INPUT': cadastral_layer,
-        'OVERLAY': blocks_layer,
-        'INPUT_FIELDS': [],
-        'OVERLAY_FIELDS': [],
-        'OUTPUT': 'memory:'
-    })['OUTPUT']
+    layer = QgsVectorLayer(geometry_type, name, 'memory')
+    layer.setCrs(crs)
+    layer.dataProvider().addAttributes(fields.toList())
+    layer.updateFields()
+    return layer
 
 
-def subtract_roads(cadastral_layer, road_buffer_layer):
+def polygon_geometry(geom):
     """
-    Subtract road reserves from cadastral polygons
+    Reduce an overlay result to its polygonal parts as a multipolygon
     
     Args:
-        cadastral_layer: QgsVectorLayer with cadastral polygons
-        road_buffer_layer: QgsVectorLayer with road buffers
+        geom: QgsGeometry returned by a GEOS overlay operation
         
     Returns:
-        QgsVectorLayer: Cadastrals with roads subtracted
+        QgsGeometry: Multipolygon, or None if nothing polygonal is left
     """
-    return processing.run('native:difference', {
-        'INPUT': cadastral_layer,
-        'OVERLAY': road_buffer_layer,
-        'OUTPUT': 'memory:'
-    })['OUTPUT']
+    if geom is None or geom.isEmpty():
+        return None
+    
+    if QgsWkbTypes.flatType(geom.wkbType()) == QgsWkbTypes.GeometryCollection:
+        parts = [part for part in geom.asGeometryCollection()
+                 if part.type() == QgsWkbTypes.PolygonGeometry]
+        if not parts:
+            return None
+        geom = QgsGeometry.collectGeometry(parts)
+    elif geom.type() != QgsWkbTypes.PolygonGeometry:
+        return None
+    
+    geom.convertToMultiType()
+    return geom
 
 
-def filter_by_area(layer, min_area, max_area):
+def area_in_range(area, min_area, max_area):
     """
-    Filter features by area constraints
+    Check an area against the min/max constraints
     
     Args:
-        layer: QgsVectorLayer to filter
+        area (float): Area in square meters
         min_area (float): Minimum area in square meters
         max_area (float): Maximum area in square meters (0 = no limit)
         
     Returns:
-        QgsVectorLayer: Filtered layer
+        bool: True if the area is within range
     """
-    if max_area > 0:
-        expression = f'$area >= {min_area} AND $area <= {max_area}'
-    else:
-        expression = f'$area >= {min_area}'
+    return area >= min_area and (max_area <= 0 or area <= max_area)
+
+
+def clip_cells_to_block(block_geom, cells, min_area, max_area):
+    """
+    Clip Voronoi cells to one block and filter them by area
     
-    return processing.run('native:extractbyexpression', {
-        'INPUT': layer,
-        'EXPRESSION': expression,
-        'OUTPUT': 'memory:'
-    })['OUTPUT']
+    Runs in a worker thread, so it only reads the block geometry and the
+    cell features it is given and returns its results instead of writing them.
+    
+    Args:
+        block_geom: QgsGeometry of the block polygon
+        cells: List of Voronoi cell features overlapping the block's bounding box
+        min_area (float): Minimum area in square meters
+        max_area (float): Maximum area in square meters (0 = no limit)
+        
+    Returns:
+        Tuple of (list of clipped features within the area range, list of
+        areas of all clipped cells before filtering)
+    """
+    # Prepared engine: fast contains/intersects tests of many cells against the block
+    block_engine = QgsGeometry.createGeometryEngine(block_geom.constGet())
+    block_engine.prepareGeometry()
+    
+    kept = []
+    areas = []
+    for feature in cells:
+        geom = feature.geometry()
+        if block_engine.contains(geom.constGet()):
+            clipped = QgsGeometry(geom)
+            clipped.convertToMultiType()
+        elif block_engine.intersects(geom.constGet()):
+            clipped = polygon_geometry(geom.intersection(block_geom))
+        else:
+            continue
+        
+        # Filter by area
+        if clipped is not None:
+            area = clipped.area()
+            areas.append(area)
+            if area_in_range(area, min_area, max_area):
+                out_feature = QgsFeature(feature)
+                out_feature.setGeometry(clipped)
+                kept.append(out_feature)
+    
+    return kept, areas
+
+
+def clip_cells(voronoi_layer, blocks_layer, min_area, max_area, sink):
+    """
+    Turn Voronoi cells into cadastrals in a single pass
+    
+    Each cell is clipped to the block(s) it overlaps (preventing cross-block
+    polygons) and kept only if its area is within range. Blocks are the
+    extent minus the road reserve, so clipping to them also subtracts the
+    road reserve. Cells are partitioned by block through a spatial index,
+    clipped in parallel worker threads in chunks of CELLS_PER_TASK cells,
+    and the results are streamed into sink from the calling thread as
+    each task completes.
+    
+    Args:
+        voronoi_layer: QgsVectorLayer with Voronoi polygons
+        blocks_layer: QgsVectorLayer with block polygons
+        min_area (float): Minimum area in square meters
+        max_area (float): Maximum area in square meters (0 = no limit)
+        sink: QgsFeatureSink (file writer or memory provider) for the cadastrals
+        
+    Returns:
+        Tuple of (number of cadastrals the sink accepted, list of areas of
+        all clipped cells before filtering, except cells culled by their
+        bounding box)
+    """
+    # A clipped cell is never larger than the cell's bounding box, so cells
+    # whose bounding box is below min_area can be dropped before any clipping
+    cells = {f.id(): f for f in voronoi_layer.getFeatures()
+             if f.geometry().boundingBox().area() >= min_area}
+    cell_index = QgsSpatialIndex()
+    cell_index.addFeatures(list(cells.values()))
+    
+    count = 0
+    areas = []
+    rejected = 0
+    error = None
+    with ThreadPoolExecutor(max_workers=WORKER_THREADS) as executor:
+        futures = set()
+        for block in blocks_layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+            block_geom = block.geometry()
+            block_cells = [cells[cell_id]
+                           for cell_id in cell_index.intersects(block_geom.boundingBox())]
+            for start in range(0, len(block_cells), CELLS_PER_TASK):
+                futures.add(executor.submit(
+                    clip_cells_to_block, block_geom,
+                    block_cells[start:start + CELLS_PER_TASK], min_area, max_area
+                ))
+        
+        for future in as_completed(futures):
+            kept, block_areas = future.result()
+            # Drop the finished future so its results can be freed once written
+            futures.discard(future)
+            written, block_error = write_features(sink, kept)
+            count += written
+            rejected += len(kept) - written
+            error = block_error or error
+            areas.extend(block_areas)
+    
+    if rejected:
+        logger.warning("%d cadastrals could not be written: %s", rejected, error)
+    
+    return count, areas
+
+
+def write_features(sink, features):
+    """
+    Add features to a sink one at a time, counting the ones it accepts
+    
+    A GeoPackage writer stops at the first feature it cannot insert (e.g. a
+    duplicate fid), so a whole-batch result would not say how many made it.
+    
+    Args:
+        sink: QgsFeatureSink (file writer or memory provider)
+        features: List of QgsFeature to add
+        
+    Returns:
+        Tuple of (number of features written, error of the last rejected
+        feature or None)
+    """
+    written = 0
+    error = None
+    for feature in features:
+        result = sink.addFeatures([feature])
+        # Data providers return (ok, features), file writers a plain ok
+        ok = result[0] if isinstance(result, tuple) else result
+        if ok:
+            written += 1
+        else:
+            error = sink.lastError()
+    return written, error
+
+
+def create_output_writer(output_path, fields, crs):
+    """
+    Open a GeoPackage writer for streaming MultiPolygon features to disk
+    
+    Args:
+        output_path (str): Output file path
+        fields: QgsFields of the output
+        crs: QgsCoordinateReferenceSystem of the output
+        
+    Returns:
+        QgsVectorFileWriter: Writer (check hasError() before use)
+    """
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = 'GPKG'
+    options.fileEncoding = 'UTF-8'
+    # The spatial index is built in one go by save_layer once all features are in
+    options.layerOptions = ['SPATIAL_INDEX=NO']
+    return QgsVectorFileWriter.create(
+        output_path,
+        fields,
+        QgsWkbTypes.MultiPolygon,
+        crs,
+        QgsProject.instance().transformContext(),
+        options
+    )
 
 
 def save_layer(layer, output_path, layer_name='Cadastrals'):
     """
-    Save layer to file and add to QGIS project
+    Save layer to file
+    
+    The returned layer is not added to the project, so callers saving
+    several layers can add them all with one addMapLayers() call.
     
     Args:
         layer: QgsVectorLayer to save
@@ -277,25 +584,34 @@ def save_layer(layer, output_path, layer_name='Cadastrals'):
         layer_name (str): Name for layer in QGIS
         
     Returns:
-        QgsVectorLayer: Saved layer or None if error
+        QgsVectorLayer: Saved layer, or the input layer if it could not be saved
     """
-    error = QgsVectorFileWriter.writeAsVectorFormat(
+    if layer.providerType() != 'memory':
+        # Already written to output_path while processing
+        layer.setName(layer_name)
+        layer.dataProvider().createSpatialIndex()
+        return layer
+    
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = 'GPKG'
+    options.fileEncoding = 'UTF-8'
+    # Bulk insert without maintaining the R-tree, then build it once below
+    options.layerOptions = ['SPATIAL_INDEX=NO']
+    error = QgsVectorFileWriter.writeAsVectorFormatV3(
         layer,
         output_path,
-        "UTF-8",
-        layer.crs(),
-        "GPKG"
+        QgsProject.instance().transformContext(),
+        options
     )
     
     if error[0] != QgsVectorFileWriter.NoError:
         print(f"⚠ Warning: Could not save to file ({error})")
         print(f"→ Adding as temporary layer instead")
-        QgsProject.instance().addMapLayer(layer)
         return layer
     
-    # Load saved layer and add to project
+    # Load saved layer and index it
     saved_layer = QgsVectorLayer(output_path, layer_name, 'ogr')
-    QgsProject.instance().addMapLayer(saved_layer)
+    saved_layer.dataProvider().createSpatialIndex()
     return saved_layer
 
 
@@ -322,7 +638,7 @@ def generate_cadastrals(config: Optional[Config] = None) -> Optional[QgsVectorLa
     try:
         config.validate()
     except ValueError as e:
-        logger.error(f"Configuration error: {e}")
+        logger.error("Configuration error: %s", e)
         return None
     
     start_time = time.time()
@@ -351,66 +667,86 @@ def generate_cadastrals(config: Optional[Config] = None) -> Optional[QgsVectorLa
     print(f"  ✓ Reprojected to metric CRS")
     
     # Step 3: Buffer roads
-    print(f"\n[3/8] Buffering roads by {config.ROAD_BUFFER_METERS}m...")
+    print(f"\n[3/6] Buffering roads by {config.ROAD_BUFFER_METERS}m...")
     road_buffer = buffer_roads(roads_projected, config.ROAD_BUFFER_METERS)
     print(f"  ✓ Road buffer created")
     
     # Step 4: Create Voronoi polygons
-    print(f"\n[4/8] Creating Voronoi polygons from buildings...")
-    voronoi = create_voronoi_polygons(buildings_projected)
-    print(f"  ✓ Voronoi polygons: {voronoi.featureCount()} features")
+    print(f"\n[4/6] Creating Voronoi polygons from buildings...")
+    
+    # Drop points far from the road network - their cells would be
+    # discarded by the block intersection anyway
+    search_extent = roads_projected.extent()
+    search_extent.grow(config.ROAD_BUFFER_METERS + config.ROAD_BUFFER_METERS * 10)
+    buildings_projected = extract_points_in_extent(buildings_projected, search_extent)
     
-    # Check if all points got polygons
-    point_count = building_layer.featureCount()
+    extent = block_extent(roads_projected, config.ROAD_BUFFER_METERS)
+    voronoi = create_voronoi_polygons(buildings_projected, extent)
     voronoi_count = voronoi.featureCount()
+    print(f"  ✓ Voronoi polygons: {voronoi_count} features")
+    
+    # Check if all points got polygons - only those inside the block extent
+    # are sure to, the others may lie wholly outside it
+    point_count = sum(1 for _ in buildings_projected.getFeatures(
+        QgsFeatureRequest().setFilterRect(extent).setNoAttributes()))
     if voronoi_count < point_count:
         print(f"  ⚠ Warning: {point_count - voronoi_count} points did not get Voronoi polygons")
         print(f"    This may indicate points at dataset edges or isolated points")
     
-    # Step 5: Subtract roads from Voronoi
-    print(f"\n[5/8] Subtracting road reserves...")
-    cadastrals = subtract_roads(voronoi, road_buffer)
-    print(f"  ✓ After subtraction: {cadastrals.featureCount()} features")
-    
-    # Step 6: Create blocks (negative space of roads)
-    print(f"\n[6/8] Creating blocks from road network...")
-    blocks = create_blocks(road_layer, config.ROAD_BUFFER_METERS, config.TARGET_CRS)
+    # Step 5: Create blocks (negative space of roads)
+    print(f"\n[5/6] Creating blocks from road network...")
+    blocks = derive_blocks_from_buffer(road_buffer, extent)
     print(f"  ✓ Blocks created: {blocks.featureCount()} features")
     
-    # Step 7: Intersect with blocks to ensure cadastrals stay within their block
-    print(f"\n[7/8] Intersecting cadastrals with blocks (prevents cross-block polygons)...")
-    cadastrals_blocked = intersect_with_blocks(cadastrals, blocks)
-    print(f"  ✓ After intersection with blocks: {cadastrals_blocked.featureCount()} features")
+    # Step 6: Intersect with blocks (prevents cross-block polygons and
+    # subtracts road reserves), filter by area and save
+    print(f"\n[6/6] Subtracting road reserves, clipping to blocks, filtering by area "
+          f"({config.MIN_AREA_SQM}-{config.MAX_AREA_SQM} m²) and saving...")
+    writer = create_output_writer(config.OUTPUT_PATH, voronoi.fields(), voronoi.crs())
+    if writer.hasError() != QgsVectorFileWriter.NoError:
+        print(f"⚠ Warning: Could not open output file ({writer.errorMessage()})")
+        print(f"→ Using a temporary layer instead")
+        cadastrals_filtered = create_polygon_layer(voronoi.crs(), voronoi.fields(), 'Cadastrals')
+        cadastral_count, areas = clip_cells(
+            voronoi,
+            blocks,
+            config.MIN_AREA_SQM,
+            config.MAX_AREA_SQM,
+            cadastrals_filtered.dataProvider()
+        )
+        cadastrals_filtered.updateExtents()
+    else:
+        cadastral_count, areas = clip_cells(
+            voronoi,
+            blocks,
+            config.MIN_AREA_SQM,
+            config.MAX_AREA_SQM,
+            writer
+        )
+        del writer  # Flush and close the output file
+        cadastrals_filtered = QgsVectorLayer(config.OUTPUT_PATH, 'Cadastrals', 'ogr')
+    print(f"  ✓ After intersection with blocks: {len(areas)} features "
+          f"(excluding cells already below {config.MIN_AREA_SQM} m²)")
     
     # Check area distribution
-    areas = [f.geometry().area() for f in cadastrals.getFeatures() 
-             if f.geometry() and not f.geometry().isEmpty()]
-    
     if areas:
-        print(f"  ✓ Area range: {min(areas):.1f} - {max(areas):.1f} m²")
-        in_range = sum(1 for a in areas if config.MIN_AREA_SQM <= a <= (config.MAX_AREA_SQM or float('inf')))
-        print(f"  ✓ Features in target range: {in_range}")
-    
-    # Step 8: Filter by area and save
-    print(f"\n[8/8] Filtering by area ({config.MIN_AREA_SQM}-{config.MAX_AREA_SQM} m²) and saving...")
-    cadastrals_filtered = filter_by_area(
-        cadastrals_blocked,
-        config.MIN_AREA_SQM,
-        config.MAX_AREA_SQM
-    )
+        print(f"  ✓ Area range of these features: {min(areas):.1f} - {max(areas):.1f} m²")
+        # clip_cells only writes cells within range, so that count is the in-range count
+        print(f"  ✓ Features in target range: {cadastral_count}")
     
     result_layer = save_layer(
         cadastrals_filtered,
         config.OUTPUT_PATH,
         'Cadastrals'
     )
+    QgsProject.instance().addMapLayers([result_layer])
     
     # Summary
     print("\n" + "=" * 70)
     print("✓ SUCCESS!")
     print("=" * 70)
     print(f"  Input buildings: {building_layer.featureCount()}")
-    print(f"  Cadastrals generated: {result_layer.featureCount()}")
+    print(f"  Cadastrals generated: {cadastral_count}")
     print(f"  Saved to: {config.OUTPUT_PATH}")
     print("=" * 70)
     
@@ -4,13 +4,75 @@ Run with: python -m pytest test_cadastral_generator.py
 """
 
 import pytest
-from qgis.core import QgsVectorLayer
+from qgis.core import (
+    QgsVectorLayer,
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsFeatureSource,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsPointXY,
+    QgsRectangle,
+    QgsVectorFileWriter,
+    QgsWkbTypes
+)
+from qgis.PyQt.QtCore import QVariant
 from qgis.testing import start_app
-from cadastral_generator import Config
+from cadastral_generator import (
+    Config,
+    area_in_range,
+    clip_cells,
+    create_output_writer,
+    create_polygon_layer,
+    create_voronoi_polygons,
+    derive_blocks_from_buffer,
+    polygon_geometry,
+    save_layer
+)
 
 # Initialize QGIS application for testing
 QGIS_APP = start_app()
 
+CRS = QgsCoordinateReferenceSystem('EPSG:32736')
+
+# Attribute carried from building points onto cells
+NAME_FIELDS = QgsFields()
+NAME_FIELDS.append(QgsField('name', QVariant.String))
+
+
+def make_point_layer(points):
+    """Create a memory point layer from a list of (x, y, name) tuples"""
+    layer = QgsVectorLayer('Point?crs=EPSG:32736&field=name:string', 'points', 'memory')
+    features = []
+    for x, y, name in points:
+        feature = QgsFeature(layer.fields())
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+        feature.setAttributes([name])
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    layer.updateExtents()
+    return layer
+
+
+def make_polygon_layer(polygons, fields=None):
+    """Create a memory polygon layer from a list of (wkt, attributes) tuples"""
+    layer = create_polygon_layer(CRS, fields or QgsFields(), 'polygons', 'Polygon')
+    features = []
+    for wkt, attributes in polygons:
+        feature = QgsFeature(layer.fields())
+        feature.setGeometry(QgsGeometry.fromWkt(wkt))
+        feature.setAttributes(attributes)
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    layer.updateExtents()
+    return layer
+
+
+def square(xmin, ymin, xmax, ymax):
+    """WKT of an axis-aligned rectangle"""
+    return QgsGeometry.fromRect(QgsRectangle(xmin, ymin, xmax, ymax)).asWkt()
+
 
 class TestConfig:
     """Test configuration validation"""
@@ -62,5 +124,225 @@ class TestLayerOperations:
         assert isinstance(config.TARGET_CRS, str)
 
 
+class TestGeometryHelpers:
+    """Test the area and geometry helpers"""
+    
+    def test_area_in_range(self):
+        """Test min/max area checks"""
+        assert area_in_range(100, 50, 200) is True
+        assert area_in_range(10, 50, 200) is False
+        assert area_in_range(300, 50, 200) is False
+    
+    def test_area_in_range_no_max(self):
+        """Test that a max area of 0 means no limit"""
+        assert area_in_range(1e9, 50, 0) is True
+    
+    def test_polygon_geometry_keeps_polygons(self):
+        """Test that polygonal parts are kept as a multipolygon"""
+        geom = QgsGeometry.fromWkt(
+            'GEOMETRYCOLLECTION(POLYGON((0 0, 10 0, 10 10, 0 10, 0 0)), LINESTRING(20 0, 30 0))'
+        )
+        result = polygon_geometry(geom)
+        assert result is not None
+        assert QgsWkbTypes.flatType(result.wkbType()) == QgsWkbTypes.MultiPolygon
+        assert result.area() == pytest.approx(100)
+    
+    def test_polygon_geometry_drops_non_polygons(self):
+        """Test that empty and non-polygonal results give None"""
+        assert polygon_geometry(None) is None
+        assert polygon_geometry(QgsGeometry()) is None
+        assert polygon_geometry(QgsGeometry.fromWkt('LINESTRING(0 0, 10 0)')) is None
+
+
+class TestVoronoi:
+    """Test Voronoi polygon creation"""
+    
+    def test_cells_carry_building_attributes(self):
+        """Test that every point gets a cell with its own attributes"""
+        points = make_point_layer([(0, 0, 'a'), (100, 0, 'b'), (50, 80, 'c')])
+        voronoi = create_voronoi_polygons(points)
+        
+        assert voronoi.featureCount() == 3
+        for cell in voronoi.getFeatures():
+            inside = [p for p in points.getFeatures() if cell.geometry().contains(p.geometry())]
+            assert len(inside) == 1
+            assert cell['name'] == inside[0]['name']
+    
+    def test_cells_cut_to_extent(self):
+        """Test that cells are cut to the extent and ones wholly outside it dropped"""
+        points = make_point_layer([(0, 0, 'a'), (100, 0, 'b'), (50, 80, 'c'), (500, 0, 'd')])
+        extent = QgsRectangle(-10, -10, 110, 90)
+        
+        voronoi = create_voronoi_polygons(points, extent)
+        
+        assert voronoi.featureCount() == 3
+        assert sorted(f['name'] for f in voronoi.getFeatures()) == ['a', 'b', 'c']
+        assert sum(f.geometry().area() for f in voronoi.getFeatures()) == pytest.approx(12000)
+
+
+class TestClipCells:
+    """Test clipping Voronoi cells to blocks"""
+    
+    def clip(self, cells, blocks, min_area, max_area):
+        """Run clip_cells into a memory layer and return (count, areas, result)"""
+        result = create_polygon_layer(cells.crs(), cells.fields(), 'cadastrals')
+        count, areas = clip_cells(cells, blocks, min_area, max_area, result.dataProvider())
+        return count, areas, result
+    
+    def test_cell_clipped_to_block(self):
+        """Test that a cell straddling a block edge is cut to the block"""
+        cells = make_polygon_layer([(square(0, 0, 10, 10), ['a'])], NAME_FIELDS)
+        blocks = make_polygon_layer([(square(0, 0, 5, 10), [])])
+        
+        count, areas, result = self.clip(cells, blocks, 1, 0)
+        
+        assert count == 1
+        assert areas == [pytest.approx(50)]
+        feature = next(result.getFeatures())
+        assert feature.geometry().area() == pytest.approx(50)
+        assert feature['name'] == 'a'
+    
+    def test_cell_inside_block_unchanged(self):
+        """Test that a cell fully inside a block keeps its geometry"""
+        cells = make_polygon_layer([(square(2, 2, 8, 8), ['a'])], NAME_FIELDS)
+        blocks = make_polygon_layer([(square(0, 0, 10, 10), [])])
+        
+        count, areas, result = self.clip(cells, blocks, 1, 0)
+        
+        assert count == 1
+        feature = next(result.getFeatures())
+        assert feature.geometry().area() == pytest.approx(36)
+    
+    def test_cell_across_blocks(self):
+        """Test that a cell spanning two blocks is written once per block"""
+        cells = make_polygon_layer([(square(0, 0, 10, 10), ['a'])], NAME_FIELDS)
+        blocks = make_polygon_layer([(square(0, 0, 4, 10), []), (square(6, 0, 10, 10), [])])
+        
+        count, areas, result = self.clip(cells, blocks, 1, 0)
+        
+        assert count == 2
+        assert sorted(areas) == [pytest.approx(40), pytest.approx(40)]
+        assert [f['name'] for f in result.getFeatures()] == ['a', 'a']
+    
+    def test_area_filter(self):
+        """Test that clipped cells outside the area range are not written"""
+        cells = make_polygon_layer(
+            [(square(0, 0, 10, 10), ['a']), (square(20, 0, 50, 30), ['b'])],
+            NAME_FIELDS
+        )
+        blocks = make_polygon_layer([(square(0, 0, 5, 10), []), (square(20, 0, 50, 30), [])])
+        
+        count, areas, result = self.clip(cells, blocks, 40, 100)
+        
+        # 'a' is clipped to 50 m² (kept), 'b' is 900 m² (above max)
+        assert count == 1
+        assert sorted(areas) == [pytest.approx(50), pytest.approx(900)]
+        assert [f['name'] for f in result.getFeatures()] == ['a']
+    
+    def test_small_cells_culled(self):
+        """Test that cells below min_area by bounding box are dropped before clipping"""
+        cells = make_polygon_layer([(square(0, 0, 10, 10), ['a'])], NAME_FIELDS)
+        blocks = make_polygon_layer([(square(0, 0, 10, 10), [])])
+        
+        count, areas, result = self.clip(cells, blocks, 200, 0)
+        
+        assert count == 0
+        assert areas == []
+    
+    def test_voronoi_then_clip(self):
+        """Smoke test: Voronoi cells clipped to one covering block keep their attributes"""
+        points = make_point_layer([(10, 10, 'a'), (90, 10, 'b'), (50, 90, 'c')])
+        voronoi = create_voronoi_polygons(points)
+        blocks = make_polygon_layer([(square(0, 0, 100, 100), [])])
+        
+        count, areas, result = self.clip(voronoi, blocks, 1, 0)
+        
+        assert count == 3
+        assert sum(areas) == pytest.approx(10000)
+        assert sorted(f['name'] for f in result.getFeatures()) == ['a', 'b', 'c']
+
+
+class TestBlocks:
+    """Test deriving blocks from a road buffer"""
+    
+    def test_road_splits_extent(self):
+        """Test that a road reserve across the extent leaves two blocks"""
+        road_buffer = make_polygon_layer([(square(4, -100, 6, 100), [])])
+        
+        blocks = derive_blocks_from_buffer(road_buffer, QgsRectangle(0, 0, 10, 10))
+        
+        areas = sorted(f.geometry().area() for f in blocks.getFeatures())
+        assert areas == [pytest.approx(40), pytest.approx(40)]
+    
+    def test_block_area_filter(self):
+        """Test that blocks outside the area range are dropped"""
+        road_buffer = make_polygon_layer([(square(4, -100, 6, 100), [])])
+        
+        blocks = derive_blocks_from_buffer(road_buffer, QgsRectangle(0, 0, 10, 10), min_area=50)
+        
+        assert blocks.featureCount() == 0
+
+
+class TestOutputWriter:
+    """Test streaming features into the output GeoPackage"""
+    
+    def test_features_written_to_gpkg(self, tmp_path):
+        """Test that features added to the writer are in the GeoPackage once it is closed"""
+        output_path = str(tmp_path / 'cadastrals.gpkg')
+        writer = create_output_writer(output_path, NAME_FIELDS, CRS)
+        assert writer.hasError() == QgsVectorFileWriter.NoError
+        
+        feature = QgsFeature(NAME_FIELDS)
+        geom = QgsGeometry.fromWkt(square(0, 0, 10, 10))
+        geom.convertToMultiType()
+        feature.setGeometry(geom)
+        feature.setAttributes(['a'])
+        writer.addFeatures([feature])
+        del writer
+        
+        layer = QgsVectorLayer(output_path, 'cadastrals', 'ogr')
+        assert layer.isValid()
+        assert layer.featureCount() == 1
+        saved = next(layer.getFeatures())
+        assert saved['name'] == 'a'
+        assert saved.geometry().area() == pytest.approx(100)
+    
+    def test_rejected_features_not_counted(self, tmp_path):
+        """Test that cadastrals the GeoPackage rejects are not counted as written"""
+        fields = QgsFields()
+        fields.append(QgsField('fid', QVariant.LongLong))
+        cells = make_polygon_layer([(square(0, 0, 10, 10), [1])], fields)
+        blocks = make_polygon_layer([(square(0, 0, 4, 10), []), (square(6, 0, 10, 10), [])])
+        output_path = str(tmp_path / 'cadastrals.gpkg')
+        writer = create_output_writer(output_path, cells.fields(), CRS)
+        
+        # Both pieces of the cell carry fid 1, so the second insert fails
+        count, areas = clip_cells(cells, blocks, 1, 0, writer)
+        del writer
+        
+        assert count == 1
+        assert len(areas) == 2
+        assert QgsVectorLayer(output_path, 'cadastrals', 'ogr').featureCount() == 1
+
+
+class TestSaveLayer:
+    """Test saving the result layer"""
+    
+    def test_memory_layer_saved_and_indexed(self, tmp_path):
+        """Test that a memory layer is written to the GeoPackage with a spatial index"""
+        layer = make_polygon_layer(
+            [(square(0, 0, 10, 10), ['a']), (square(20, 0, 30, 10), ['b'])],
+            NAME_FIELDS
+        )
+        output_path = str(tmp_path / 'cadastrals.gpkg')
+        
+        saved = save_layer(layer, output_path, 'Cadastrals')
+        
+        assert saved.providerType() == 'ogr'
+        assert saved.name() == 'Cadastrals'
+        assert sorted(f['name'] for f in saved.getFeatures()) == ['a', 'b']
+        assert saved.dataProvider().hasSpatialIndex() == QgsFeatureSource.SpatialIndexPresent
+
+
 if __name__ == '__main__':
     pytest.main([__file__])